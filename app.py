@@ -1,8 +1,17 @@
 import streamlit as st
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import re
+import threading
+import time
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import google.generativeai as genai
+from urllib.parse import urlparse
+from google import genai
+from google.genai import types
 
 # Configuration
 st.set_page_config(
@@ -13,110 +22,293 @@ st.set_page_config(
 
 GITHUB_API = "https://api.github.com"
 GEMINI_KEY = st.secrets.get("gemini_key", None)
+GITHUB_TOKEN = st.secrets.get("github_token", None)
+GEMINI_MODEL = "gemini-2.5-flash"
 
 # Gemini Model Initialization
+ANALYSIS_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "summary": types.Schema(type=types.Type.STRING),
+        "score": types.Schema(type=types.Type.INTEGER),
+        "level": types.Schema(type=types.Type.STRING, enum=["Beginner", "Intermediate", "Advanced"]),
+        "medal": types.Schema(type=types.Type.STRING, enum=["Bronze", "Silver", "Gold"]),
+        "strengths": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+        "improvements": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+        "roadmap": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING))
+    },
+    required=["summary", "score", "level", "medal", "strengths", "improvements", "roadmap"],
+    # Without an explicit order the API emits keys alphabetically; summary goes first so it can stream early
+    property_ordering=["summary", "score", "level", "medal", "strengths", "improvements", "roadmap"]
+)
+
+SYSTEM_INSTRUCTION = """You are an AI Coding Mentor. Analyze the GitHub repository described by the user and provide a structured evaluation focused on giving honest, actionable feedback.
+
+Fill in the response fields as follows:
+- summary: 2-3 sentences of honest feedback on the project's current quality, structure, and potential.
+- score: 0-100 integer.
+- level: Beginner, Intermediate or Advanced.
+- medal: Bronze, Silver or Gold.
+- strengths: 3 strengths.
+- improvements: 3 improvements.
+- roadmap: 3-5 specific, actionable steps the student can immediately follow to improve the project's grade (e.g., Add unit tests, Improve folder structure, Commit regularly), focusing on documentation, testing, and Git best practices.
+
+Be critical but fair. Score based on code quality, documentation, popularity, activity, and practical usefulness."""
+
+ANALYSIS_CONFIG = types.GenerateContentConfig(
+    system_instruction=SYSTEM_INSTRUCTION,
+    response_mime_type="application/json",
+    response_schema=ANALYSIS_SCHEMA,
+    temperature=0.2,
+    top_p=0.9,
+    max_output_tokens=4096 # gemini-2.5-flash counts thinking tokens here, so leave headroom beyond the JSON itself
+)
+
+# One client per process, shared by the warm-up ping and the real analysis so both use the same connection
 @st.cache_resource
+def get_gemini_client(api_key):
+    return genai.Client(api_key=api_key)
+
 def init_gemini(api_key):
     if not api_key:
         st.error("Gemini API Key not found in secrets.toml. Please configure it.")
         st.stop()
     try:
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel('gemini-2.5-flash')
+        return get_gemini_client(api_key)
     except Exception as e:
         st.error(f"Error initializing Gemini: {e}")
         st.stop()
 
-model = init_gemini(GEMINI_KEY)
+# Runs once per process: a 1-token background call on the shared client primes its connection and auth before the first real analysis
+@st.cache_resource
+def warm_up_gemini(api_key):
+    try:
+        client = get_gemini_client(api_key)
+    except Exception:
+        return None # Best effort only; init_gemini reports configuration errors on the real call
+
+    def ping():
+        try:
+            client.models.generate_content(
+                model=GEMINI_MODEL, contents="ping", config=types.GenerateContentConfig(max_output_tokens=1)
+            )
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=ping, daemon=True)
+    thread.start()
+    return thread
+
+# Shared GitHub HTTP Session (keep-alive, connection pooling and retries across reruns)
+class CappedRetry(Retry):
+    # Honour Retry-After, but clamp it so a rate-limited retry never blocks the UI for minutes
+    MAX_RETRY_AFTER = 2
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, self.MAX_RETRY_AFTER)
+
+@st.cache_resource
+def init_session():
+    session = requests.Session()
+    session.headers.update({"Accept": "application/vnd.github.v3+json", "Accept-Encoding": "gzip, deflate"})
+    retry = CappedRetry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=("GET", "HEAD", "POST"), # The only POST is the read-only GraphQL query
+        respect_retry_after_header=True,
+        raise_on_status=False # Hand the last response back so the status-code checks still apply
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry))
+    return session
+
+_SESSION = init_session()
 
 # GitHub Data Fetching
+# Failures are raised rather than returned: st.cache_data does not cache exceptions, so a failed fetch is retried next time
+class GitHubAPIError(Exception):
+    pass
+
+LINK_LAST_PAGE = re.compile(r'<[^>]*[?&]page=(\d+)>;\s*rel="last"')
+
+REPO_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    name
+    description
+    stargazerCount
+    forkCount
+    primaryLanguage { name }
+    url
+    repositoryTopics(first: 20) { nodes { topic { name } } }
+    root: object(expression: "HEAD:") { ...TreeNames }
+    githubDir: object(expression: "HEAD:.github") { ...TreeNames }
+    docsDir: object(expression: "HEAD:docs") { ...TreeNames }
+    defaultBranchRef { target { ... on Commit { history(first: 0) { totalCount } } } }
+  }
+}
+
+fragment TreeNames on Tree { entries { name type } }
+"""
+
+def fetch_repo_data_graphql(owner, repo, headers):
+    # GitHub's GraphQL API requires authentication, so this path is only used when a github_token secret is set
+    response = _SESSION.post(
+        f"{GITHUB_API}/graphql",
+        headers=headers,
+        json={"query": REPO_QUERY, "variables": {"owner": owner, "name": repo}},
+        timeout=5
+    )
+    if response.status_code != 200:
+        message = orjson.loads(response.content).get('message', 'Unknown Error')
+        raise GitHubAPIError(f"GitHub API failed: {response.status_code} - {message}")
+    payload = orjson.loads(response.content)
+    repo_data = (payload.get("data") or {}).get("repository")
+    if payload.get("errors") or not repo_data:
+        message = payload.get("errors", [{}])[0].get('message', 'Unknown Error')
+        raise GitHubAPIError(f"GitHub API failed: {message}")
+
+    topics = [node["topic"]["name"] for node in repo_data["repositoryTopics"]["nodes"]]
+    # Look in the same places as the REST /readme endpoint: the root, .github/ and docs/, any README format
+    has_readme = any(
+        entry["type"] == "blob" and entry["name"].lower().startswith("readme")
+        for tree in (repo_data.get("root"), repo_data.get("githubDir"), repo_data.get("docsDir"))
+        for entry in (tree or {}).get("entries", [])
+    )
+    history = ((repo_data.get("defaultBranchRef") or {}).get("target") or {}).get("history") or {}
+    return {
+        "name": repo_data.get("name"),
+        "description": repo_data.get("description"),
+        "stars": repo_data.get("stargazerCount", 0),
+        "forks": repo_data.get("forkCount", 0),
+        "language": (repo_data.get("primaryLanguage") or {}).get("name") or "Unknown",
+        "url": repo_data.get("url"),
+        "commits": history.get("totalCount", 0),
+        "readme": "README exists and is accessible" if has_readme else "No README found",
+        "topics": topics,
+        "topics_str": ', '.join(topics) or 'None'
+    }
+
+@st.cache_data(ttl=15 * 60, show_spinner=False)
 def fetch_repo_data(owner, repo, token=None):
-    headers = {"Accept": "application/vnd.github.v3+json"}
+    headers = {}
     if token:
         headers["Authorization"] = f"token {token}"
     
     try:
+        if token:
+            return fetch_repo_data_graphql(owner, repo, headers)
+
         repo_url = f"{GITHUB_API}/repos/{owner}/{repo}"
-        repo_response = requests.get(repo_url, headers=headers, timeout=5)
-        if repo_response.status_code != 200:
-            message = repo_response.json().get('message', 'Unknown Error')
-            return {"error": f"GitHub API failed: {repo_response.status_code} - {message}"}
-        repo_data = repo_response.json()
-
-        commits_url = f"{GITHUB_API}/repos/{owner}/{repo}/commits" # Fetch commits (top 50 for consistency metric)
-        commits_data = requests.get(commits_url, headers=headers, params={"per_page": 50}, timeout=5).json()
-        
-        readme_url = f"{GITHUB_API}/repos/{owner}/{repo}/contents/README.md" # Check for README.md existence
-        readme = requests.head(readme_url, headers=headers, timeout=5)
+        commits_url = f"{GITHUB_API}/repos/{owner}/{repo}/commits" # One commit per page, so the last page number is the commit count
+        readme_url = f"{GITHUB_API}/repos/{owner}/{repo}/readme" # Preferred README in any format (README.md, README.rst, ...)
+
+        # The three calls are independent, so fire them concurrently on the shared session
+        executor = ThreadPoolExecutor(max_workers=3)
+        try:
+            repo_future = executor.submit(_SESSION.get, repo_url, headers=headers, timeout=5)
+            commits_future = executor.submit(_SESSION.get, commits_url, headers=headers, params={"per_page": 1}, timeout=5)
+            readme_future = executor.submit(_SESSION.head, readme_url, headers=headers, timeout=5)
+
+            repo_response = repo_future.result()
+            if repo_response.status_code != 200:
+                message = orjson.loads(repo_response.content).get('message', 'Unknown Error')
+                raise GitHubAPIError(f"GitHub API failed: {repo_response.status_code} - {message}")
+            repo_data = orjson.loads(repo_response.content)
+
+            commits_response = commits_future.result()
+            readme = readme_future.result()
+        finally:
+            # Don't hold an error back waiting on the other in-flight requests
+            executor.shutdown(wait=False, cancel_futures=True)
+
         readme_text = "README exists and is accessible" if readme.status_code == 200 else "No README found"
+        topics = repo_data.get("topics", [])
+        last_page = LINK_LAST_PAGE.search(commits_response.headers.get("Link", ""))
+        if last_page:
+            commits = int(last_page.group(1))
+        else:
+            commits_data = orjson.loads(commits_response.content) # No Link header means a single page of at most one commit
+            commits = len(commits_data) if isinstance(commits_data, list) else 0
         return {
             "name": repo_data.get("name"),
             "description": repo_data.get("description"),
             "stars": repo_data.get("stargazers_count", 0),
             "forks": repo_data.get("forks_count", 0),
-            "language": repo_data.get("language", "Unknown"),
+            "language": repo_data.get("language") or "Unknown",
             "url": repo_data.get("html_url"),
-            "commits": len(commits_data) if isinstance(commits_data, list) else 0,
+            "commits": commits,
             "readme": readme_text,
-            "topics": repo_data.get("topics", [])
+            "topics": topics,
+            "topics_str": ', '.join(topics) or 'None'
         }
-    except requests.exceptions.Timeout:
-        return {"error": "Request to GitHub timed out."}
+    except GitHubAPIError:
+        raise
+    except requests.exceptions.Timeout as e:
+        raise GitHubAPIError("Request to GitHub timed out.") from e
     except Exception as e:
-        return {"error": f"An unexpected error occurred: {str(e)}"}
+        raise GitHubAPIError(f"An unexpected error occurred: {str(e)}") from e
 
 # AI Prompt Generation and Call
-def get_ai_analysis(repo_data):
-    data_for_prompt = {
-        "name": repo_data.get('name', 'N/A'),
-        "description": repo_data.get('description', 'N/A'),
-        "stars": repo_data.get('stars', 0),
-        "forks": repo_data.get('forks', 0),
-        "language": repo_data.get('language', 'Unknown'),
-        "commits": repo_data.get('commits', 0),
-        "readme": repo_data.get('readme', 'N/A'),
-        "topics": ', '.join(repo_data.get('topics', [])) if repo_data.get('topics') else 'None'
-    }
+PROMPT_TMPL = """Repository Data:
+- Name: {name}
+- Description: {description}
+- Stars: {stars}
+- Forks: {forks}
+- Language: {language}
+- Total Commits: {commits}
+- README Status: {readme}
+- Topics: {topics_str}"""
+
+PROMPT_DEFAULTS = {
+    "name": "N/A",
+    "description": "N/A",
+    "stars": 0,
+    "forks": 0,
+    "language": "Unknown",
+    "commits": 0,
+    "readme": "N/A",
+    "topics_str": "None"
+}
+
+SUMMARY_PREFIX = re.compile(r'"summary"\s*:\s*"((?:[^"\\]|\\.)*)')
+PARTIAL_ESCAPE = re.compile(r'(?<!\\)((?:\\\\)*)\\(?:u[0-9a-fA-F]{0,3})?$')
+
+def decode_partial_json_string(fragment):
+    # Drop an escape sequence cut off mid-stream (a lone backslash or a partial \uXXXX) before decoding
+    fragment = PARTIAL_ESCAPE.sub(r'\1', fragment)
+    try:
+        return orjson.loads(f'"{fragment}"')
+    except orjson.JSONDecodeError: # e.g. a surrogate pair split across chunks; the next chunk completes it
+        return None
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def get_ai_analysis(repo_data, _client):
+    prompt = PROMPT_TMPL.format_map(ChainMap(repo_data, PROMPT_DEFAULTS))
+
+    response = _client.models.generate_content_stream(model=GEMINI_MODEL, contents=prompt, config=ANALYSIS_CONFIG)
+    placeholder = st.empty()
+    response_text = ""
+    for chunk in response:
+        response_text += chunk.text or ""
+        # Show the summary field while the rest of the JSON is still generating
+        summary = SUMMARY_PREFIX.search(response_text)
+        summary = summary and decode_partial_json_string(summary.group(1))
+        if summary:
+            placeholder.info(summary)
 
-    prompt = f"""You are an AI Coding Mentor. Analyze this GitHub repository and provide a structured evaluation focused on giving honest, actionable feedback.
-
-Repository Data:
-- Name: {data_for_prompt['name']}
-- Description: {data_for_prompt['description']}
-- Stars: {data_for_prompt['stars']}
-- Forks: {data_for_prompt['forks']}
-- Language: {data_for_prompt['language']}
-- Total Commits (from last 50): {data_for_prompt['commits']}
-- README Status: {data_for_prompt['readme']}
-- Topics: {data_for_prompt['topics']}
-
-Provide a JSON response with exactly this structure:
-{{
-    "score": <0-100 integer>,
-    "level": "<Beginner/Intermediate/Advanced>",
-    "medal": "<Bronze/Silver/Gold>",
-    "summary": "<2-3 sentences of honest feedback on the project's current quality, structure, and potential.>",
-    "strengths": ["<strength1>", "<strength2>", "<strength3>"],
-    "improvements": ["<improvement1>", "<improvement2>", "<improvement3>"],
-    "roadmap": ["<Actionable Step 1, e.g., Add unit tests>", "<Actionable Step 2, e.g., Improve folder structure>", "<Actionable Step 3, e.g., Commit regularly>"]
-}}
-
-Be critical but fair. Score based on code quality, documentation, popularity, activity, and practical usefulness. The 'roadmap' array MUST provide 3-5 specific, actionable steps the student can immediately follow to improve the project's grade, focusing on documentation, testing, and Git best practices."""
-
-    response = model.generate_content(prompt)
-    response_text = response.text.strip()
     try:
-        if response_text.startswith("```json"):
-             response_text = response_text.replace("```json", "", 1).rstrip("`").strip()
-        elif response_text.startswith("```"):
-             response_text = response_text.replace("```", "", 1).rstrip("`").strip()
-        
-        result = json.loads(response_text)
-        return result
-    except json.JSONDecodeError:
+        result = orjson.loads(response_text)
+    except orjson.JSONDecodeError: # The schema guarantees valid JSON unless generation is cut short
         st.error("Failed to parse AI response. The model may have returned invalid JSON.")
         st.code(response_text)
-        return {"error": "Invalid AI response format."}
+        st.stop() # Stop instead of returning so an invalid response is never cached
+
+    # The streamed preview becomes the final summary in place, so the text doesn't jump elsewhere on completion
+    placeholder.info(result.get('summary', 'No summary available.'))
+    result["analyzed_at"] = time.time() # Stamped inside the cached call so cache hits keep the original analysis time
+    return result
 
 # Streamlit App Layout
 def main():
@@ -124,6 +316,9 @@ def main():
     st.caption("Automated GitHub Repository Analysis powered by Gemini 2.5 Flash.")
     st.divider()
 
+    if GEMINI_KEY:
+        warm_up_gemini(GEMINI_KEY)
+
     repo_url = st.text_input(
         "Enter GitHub Repository URL",
         placeholder="e.g., https://github.com/owner/repo",
@@ -135,96 +330,100 @@ def main():
             st.error("Please enter a repository URL.")
             return
 
-        if 'last_analyzed_url' in st.session_state and st.session_state.last_analyzed_url == repo_url:
-             st.info("Repository already analyzed. Please enter a new URL or refresh the page to re-analyze.")
-             return
+        client = init_gemini(GEMINI_KEY) # Created on first analysis, not at import, so the page renders immediately
 
         with st.spinner("🔄 Fetching data and analyzing repository..."):
             try:
-                url_parts = repo_url.strip().rstrip('/').split('/')
-                if len(url_parts) < 2 or url_parts[-2] == "" or url_parts[-1] == "":
+                repo_url = repo_url.strip()
+                if "://" not in repo_url:
+                    repo_url = f"https://{repo_url}" # Accept scheme-less input like github.com/owner/repo
+                parsed_url = urlparse(repo_url)
+                url_parts = parsed_url.path.strip('/').split('/', 2)
+                if parsed_url.hostname not in ("github.com", "www.github.com") or len(url_parts) < 2 or not all(url_parts[:2]):
                     st.error("Invalid repository URL format. Please use the full URL.")
                     return
-                    
-                owner = url_parts[-2]
-                repo = url_parts[-1]
 
-                repo_data = fetch_repo_data(owner, repo)
-                
-                if "error" in repo_data:
-                    st.error(f"Error fetching repository data: {repo_data['error']}")
-                    return
+                owner, repo = url_parts[0], url_parts[1]
 
-                result = get_ai_analysis(repo_data)
-                
-                if "error" in result:
+                try:
+                    repo_data = fetch_repo_data(owner, repo, GITHUB_TOKEN)
+                except GitHubAPIError as e:
+                    st.error(f"Error fetching repository data: {e}")
                     return
 
-                st.session_state.last_analyzed_url = repo_url # Store URL to prevent double-analysis
-                st.balloons()
-                st.success("Analysis Complete!")
-                
                 # Display Results
-                
-                # 1. Scorecard Section
+
+                # 1. Scorecard Section - the GitHub-only parts render before the AI call so they can be read while Gemini works
                 st.header(f"Evaluation for **{repo_data['name']}**")
-                
+                st.markdown(f"🔗 [View on GitHub]({repo_data['url']}) | Topics: **{repo_data['topics_str']}**")
+                status_slot = st.empty()
+
                 medal_map = {"Gold": "🥇", "Silver": "🥈", "Bronze": "🥉"}
                 
                 col1, col2, col3, col4 = st.columns(4)
                 
                 with col1:
-                    st.metric("Score", f"{result.get('score', 0)}/100")
+                    score_slot = st.empty()
+                    score_slot.metric("Score", "…")
                 
                 with col2:
-                    st.metric("Level", result.get('level', 'Unknown'))
+                    level_slot = st.empty()
+                    level_slot.metric("Level", "…")
                 
                 with col3:
-                    st.metric("Medal", f"{medal_map.get(result.get('medal', 'Bronze'), '⭐')} {result.get('medal', 'Bronze')}")
+                    medal_slot = st.empty()
+                    medal_slot.metric("Medal", "…")
                 
                 with col4:
                     st.metric("Language", repo_data.get('language', 'Unknown'))
 
                 st.divider()
+
+                # 2. Summary and Feedback - get_ai_analysis streams the summary into this section
+                st.subheader("📋 Summary & Feedback")
+                result = get_ai_analysis(repo_data, client)
+
+                score_slot.metric("Score", f"{result.get('score', 0)}/100")
+                level_slot.metric("Level", result.get('level', 'Unknown'))
+                medal_slot.metric("Medal", f"{medal_map.get(result.get('medal', 'Bronze'), '⭐')} {result.get('medal', 'Bronze')}")
+
+                st.balloons()
+                status_slot.success("Analysis Complete!")
+
+                st.divider()
                 
-                # 2. Roadmap
+                # 3. Roadmap
                 st.subheader("💡 Personalized Roadmap: Your Next Steps")
                 st.markdown("**This is your guidance from an AI coding mentor.**")
                 
                 roadmap_steps = result.get('roadmap', [])
                 if roadmap_steps:
-                    for i, step in enumerate(roadmap_steps):
-                        st.write(f"**{i+1}.** {step}")
+                    st.markdown("\n\n".join(f"**{i+1}.** {step}" for i, step in enumerate(roadmap_steps)))
                 else:
                     st.info("The AI did not generate specific roadmap steps.")
 
                 st.divider()
 
-                # Summary and Feedback
-                st.subheader("📋 Summary & Feedback")
-                st.info(result.get('summary', 'No summary available.'))
-                st.markdown(f"🔗 [View on GitHub]({repo_data['url']}) | Topics: **{', '.join(repo_data.get('topics', [])) or 'None'}**")
-                
-                st.divider()
-
-                # 3. Detailed Strengths and Improvements
+                # 4. Detailed Strengths and Improvements
                 st.subheader("Detailed Strengths and Improvements")
                 
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown("#### ✅ Strengths")
-                    for strength in result.get('strengths', []):
-                        st.success(f"• {strength}")
+                    strengths = result.get('strengths', [])
+                    if strengths:
+                        st.success("\n\n".join(f"• {strength}" for strength in strengths))
                 
                 with col2:
                     st.markdown("#### 🎯 Areas to Improve")
-                    for improvement in result.get('improvements', []):
-                        st.warning(f"• {improvement}")
+                    improvements = result.get('improvements', [])
+                    if improvements:
+                        st.warning("\n\n".join(f"• {improvement}" for improvement in improvements))
                 
                 st.divider()
                 
-                st.caption(f"Analysis performed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                st.caption(f"Analysis performed at {datetime.fromtimestamp(result['analyzed_at']):%Y-%m-%d %H:%M:%S}")
 
             except Exception as e:
                 st.error(f"An unexpected error occurred during analysis: {str(e)}")